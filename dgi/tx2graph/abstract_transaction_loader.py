@@ -18,153 +18,211 @@
 Abstract Transaction Loader Module
 """
 
-import re
-
-import json
-from collections import OrderedDict
+import functools
 from abc import ABC, abstractmethod
-from typing import Dict
-import yaml
+import ijson
 from neomodel import db
-from neomodel import StructuredNode
+from dgi.models import ClassNode, MethodNode, SQLTable
 from dgi.utils.logging import Log
 from dgi.utils.progress_bar_factory import ProgressBarFactory
 from dgi.tx2graph.utils import sqlexp
 
 
-class AbstractTransactionLoader(ABC):
-    """ABC for tx2graph
+def crud0(ast, write=False):
+    """Second stage CRUD
+
+    Walks the AST with an explicit stack. Each entry carries the sets that collect the
+    tables it reads and writes; None discards them.
     """
-    @staticmethod
-    def _consume_and_process_label(label: str) -> Dict:
-        """Format label into a proper JSON string
+    read_set, write_set = set(), set()
+    stack = [(ast, write, read_set, write_set)]
+    while stack:
+        node, write, reads, writes = stack.pop()
+        if isinstance(node, list):
+            child_write = node[0] != "select"
+            for child in node[1:]:
+                stack.append((child, child_write, reads, writes))
+        elif isinstance(node, dict) and ":from" in node:
+            tables = writes if write else reads
+            for txn in node[":from"]:
+                if isinstance(txn, tuple):
+                    continue
+                if isinstance(txn, dict):
+                    txn = next(iter(txn.values()))
+                if isinstance(txn, list):
+                    # Only the tables read by a nested query are accessed by this clause
+                    stack.append((txn, False, tables, None))
+                elif tables is not None:
+                    tables.add(txn)
+    return [read_set, write_set]
 
-        Args:
-        label (str): The label as an unformatted string
-        """
 
-        # -- DiVA's JSON is malformed. Here, we fix those malformations --
-        label = re.sub(r"\n", "", label)
-        label = re.sub(r" ", "", label)
-        label = re.sub(r"{", '{"', label)
-        label = re.sub(r":", '":', label)
-        label = re.sub(r",", ',"', label)
-        label = re.sub(r"\[", '["', label)
-        label = re.sub(r"\]", '"]', label)
+@functools.lru_cache(maxsize=4096)
+def crud(sql):
+    """First stage CRUD
+
+    Traces repeat the same statements many times, so the results are cached by SQL text.
+    """
+    resp = sqlexp(sql.lower())  # pylint: disable=not-callable
+    if resp:
+        read_set, write_set = crud0(resp[1])
+        return frozenset(read_set), frozenset(write_set)
+    return frozenset(), frozenset()
+
 
-        # -- convert to json --
-        label = json.loads(label)
+def analyze(txn_set):
+    """Analyze the transaction set
 
-        return label
+    Attaches the rwset of each transaction: the (read, write) sets of the tables it accesses, including those of
+    its nested transactions. Statements that are not preceded by a BEGIN belong to an implicit transaction.
+    """
+    for txn in txn_set:
+        operands = txn["transaction"]
+        rwset = (set(), set())
+        stack = [] if operands and operands[0]["sql"] == "BEGIN" else [rwset]
+        for i, operand in enumerate(operands):
+            sql = operand["sql"]
+            if sql == "BEGIN":
+                stack.append(rwset if i == 0 else (set(), set()))
+            elif sql in ("COMMIT", "ROLLBACK"):
+                read_set, write_set = stack.pop()
+                if stack:
+                    stack[-1][0].update(read_set)
+                    stack[-1][1].update(write_set)
+            else:
+                read_set, write_set = crud(sql)
+                stack[-1][0].update(read_set)
+                stack[-1][1].update(write_set)
+        txn["rwset"] = rwset
+    return txn_set
+
+
+class AbstractTransactionLoader(ABC):
+    """ABC for tx2graph
+    """
+    # Number of buffered rows that triggers a write to the database
+    batch_size = 1000
+    # Whether the loader builds the transaction callgraphs. Otherwise the stack traces are not buffered.
+    has_callgraph = False
+
+    def __init__(self):
+        self._pending_reads = []
+        self._pending_writes = []
+        self._callgraph_buf = []
 
     @staticmethod
     def _clear_all_nodes(force_clear_all: bool):
         """Delete all nodes"""
         Log.warn("The CLI argument clear is turned ON. Deleting pre-existing nodes.")
-        db.cypher_query("MATCH (n:SQLTable)-[r]-(m) DELETE r")
-        db.cypher_query("MATCH (n)-[r]-(m:SQLTable) DELETE r")
-        db.cypher_query("MATCH (n:SQLTable) DELETE n")
-        db.cypher_query("MATCH (n:SQLColumn)-[r]-(m) DELETE r")
-        db.cypher_query("MATCH (n)-[r]-(m:SQLColumn) DELETE r")
-        db.cypher_query("MATCH (n:SQLColumn) DELETE n")
+        db.cypher_query("MATCH (n) WHERE n:SQLTable OR n:SQLColumn DETACH DELETE n")
         if force_clear_all:
             Log.warn("Force clear has been turned ON. ALL nodes will be deleted.")
-            db.cypher_query("MATCH (n)-[r]-(m) DELETE r")
-            db.cypher_query("MATCH (n) DELETE n")
-
-    def crud0(self, ast, write=False):
-        """Second stage CRUD"""
-        if isinstance(ast, list):
-            res = [set(), set()]
-            for child in ast[1:]:
-                read_set, write_set = self.crud0(child, ast[0] != "select")
-                res[0] |= read_set
-                res[1] |= write_set
-            return res
-
-        if isinstance(ast, dict) and ":from" in ast:
-            txn_set = [
-                list(txn.values())[0] if isinstance(txn, dict) else txn
-                for txn in ast[":from"]
-                if not isinstance(txn, tuple)
-            ]
-            res = set()
-            for txn in txn_set:
-                if isinstance(txn, list):
-                    res |= self.crud0(txn, False)[0]
-                else:
-                    res.add(txn)
-            return [set(), res] if write else [res, set()]
-
-        return [set(), set()]
-
-    def crud(self, sql):
-        """First stage CRUD"""
-        resp = sqlexp(sql.lower())  # pylint: disable=not-callable
-        if resp:
-            return self.crud0(resp[1])
-        return [set(), set()]
-
-    def analyze(self, txn_set):
-        """Analyze the transaction set"""
-        for txn in txn_set:
-            stack = []
-            if txn["transaction"] and txn["transaction"][0]["sql"] != "BEGIN":
-                txn["transaction"] = [{"sql": "BEGIN"}] + txn["transaction"]
-            for operand in txn["transaction"]:
-                if operand["sql"] == "BEGIN":
-                    stack.append([set(), set()])
-                    operand["rwset"] = stack[-1]
-                elif operand["sql"] in ("COMMIT", "ROLLBACK"):
-                    if len(stack) > 1:
-                        stack[-2][0] |= stack[-1][0]
-                        stack[-2][1] |= stack[-1][1]
-                    stack[-1][0] = set(stack[-1][0])
-                    stack[-1][1] = set(stack[-1][1])
-                    stack.pop()
-                else:
-                    read_set, write_set = self.crud(operand["sql"])
-                    stack[-1][0] |= read_set
-                    stack[-1][1] |= write_set
-        return txn_set
+            db.cypher_query("MATCH (n) DETACH DELETE n")
 
-    @abstractmethod
-    def find_or_create_program_node(self, method_signature: str) -> StructuredNode:
-        """Create an node pertaining to a program feature like class, method, etc.
+    @staticmethod
+    def _create_indexes():
+        """Create the indexes backing the MERGE lookups of the transaction loaders
 
-        Args:
-            method_signature (_type_): The full method method signature
+        These are plain indexes: a uniqueness constraint would fail on graphs written by other loaders that do not
+        guarantee unique keys, and would then make those loaders fail.
         """
+        for model, key in (
+            (SQLTable, "name"),
+            (MethodNode, "node_method"),
+            (ClassNode, "node_short_name"),
+        ):
+            db.cypher_query(f"CREATE INDEX IF NOT EXISTS FOR (n:{model.__label__}) ON (n.{key})")
+
+    def _merge_program_node(self, var: str, props: str) -> str:
+        """Cypher clause that finds or creates a program node from a map of its properties"""
+        label = self.program_node_model.__label__
+        key = self.program_node_key
+        return (
+            f"MERGE ({var}:{label} {{{key}: {props}.{key}}}) "
+            f"ON CREATE SET {var} += {props}, {var}.node_id = replace(randomUUID(), '-', '') "
+        )
+
+    def flush(self):
+        """Write all the buffered transaction edges to the database"""
+        if self._callgraph_buf:
+            self.populate_transaction_callgraphs(self._callgraph_buf)
+            self._callgraph_buf = []
+
+        if self._pending_reads:
+            db.cypher_query(
+                "UNWIND $rows AS row "
+                "MERGE (t:SQLTable {name: row.table}) "
+                + self._merge_program_node("p", "row.program")
+                + "MERGE (t)-[r:TRANSACTION_READ]->(p) ON CREATE SET r += row.props",
+                {"rows": self._pending_reads},
+            )
+            self._pending_reads = []
+
+        if self._pending_writes:
+            db.cypher_query(
+                "UNWIND $rows AS row "
+                "MERGE (t:SQLTable {name: row.table}) "
+                + self._merge_program_node("p", "row.program")
+                + "MERGE (p)-[r:TRANSACTION_WRITE]->(t) ON CREATE SET r += row.props",
+                {"rows": self._pending_writes},
+            )
+            self._pending_writes = []
+
+    @property
+    @abstractmethod
+    def program_node_model(self):
+        """The node model of the program features (classes, methods, etc.) linked to the SQL tables"""
 
+    @property
     @abstractmethod
-    def find_or_create_sql_table_node(self, table_name: str) -> StructuredNode:
-        """Create an nodes pertaining to a SQL Table.
+    def program_node_key(self) -> str:
+        """The property of the program node model used to find existing nodes"""
+
+    @abstractmethod
+    def program_node_properties(self, method_signature: str, is_entrypoint: bool = False) -> dict:
+        """Properties of the node pertaining to a program feature like class, method, etc.
 
         Args:
-            table_name (str): The name of the table
+            method_signature (str): The full method method signature
+            is_entrypoint (bool):   Whether the method is the entrypoint of a transaction
         """
 
-    @abstractmethod
-    def populate_transaction_read(self, method_signature, txid, table, action, the_sql_query) -> None:  # noqa: R0913
-        """Add transaction read edges to the database
+    def _edge_row(self, method_signature, txid, table, action, the_sql_query) -> dict:
+        """The row of a transaction edge between a program node and a table, as written by flush"""
+        return {
+            "table": table,
+            "program": self.program_node_properties(method_signature),
+            "props": {
+                "txid": txid,
+                "tx_meth": method_signature.split(".")[-1],
+                "action": action,
+                "sql_query": the_sql_query,
+            },
+        }
+
+    def populate_transaction_read(self, method_signature, txid, table, action, the_sql_query) -> None:
+        """Queue transaction read edges to be added to the database
 
         Args:
-            label (dict): This is a dictionary of the attribute information for the edge. It contains information such
-                          as the entrypoint class, method, etc.
-            txid (int):   This is the ID assigned to the transaction.
-            table (str):  The is the name of the table.
+            method_signature (str): The full signature of the method that reads the table.
+            txid (int):             This is the ID assigned to the transaction.
+            table (str):            The is the name of the table.
+            action (str):           The action that initiated the transaction
+            the_sql_query (str):    The SQL statement that reads the table.
         """
+        self._pending_reads.append(self._edge_row(method_signature, txid, table, action, the_sql_query))
 
-    @abstractmethod
     def populate_transaction_write(self, method_signature, txid, table, action, the_sql_query) -> None:
-        """Add transaction write edges to the database
+        """Queue transaction write edges to be added to the database
 
         Args:
-            label (dict): This is a dictionary of the attribute information for the edge. It contains information such
-                          as the entrypoint class, method, etc.
-            txid (int):   This is the ID assigned to the transaction.
-            table (str):  The is the name of the table.
+            method_signature (str): The full signature of the method that writes the table.
+            txid (int):             This is the ID assigned to the transaction.
+            table (str):            The is the name of the table.
+            action (str):           The action that initiated the transaction
+            the_sql_query (str):    The SQL statement that writes the table.
         """
+        self._pending_writes.append(self._edge_row(method_signature, txid, table, action, the_sql_query))
 
     # pylint: disable=too-many-arguments
     @abstractmethod
@@ -189,67 +247,70 @@ class AbstractTransactionLoader(ABC):
             action (str):        The action that initiated the transaction
         """
 
-    @abstractmethod
-    def populate_transaction_callgraph(
-        self, callstack: dict, tx_id: int, entrypoint: str
-    ) -> None:
-        """Add transaction write edges to the database
+    def populate_transaction_callgraphs(self, batch: list) -> None:
+        """Add the transaction callgraph edges of a batch of transactions to the database
+
+        Only called for loaders that set has_callgraph.
 
         Args:
-            callstack (dict): The callstack from the entrypoint to the transaction.
-            tx_id (int)      : This is the ID assigned to the transaction.
-            entrypoint (str): The entrypoint that initiated this transaction.
+            batch (list): A dict for each transaction with the "frames" of the callstack from the entrypoint to the
+                          transaction, the "tx_id" assigned to the transaction and the "entrypoint" that initiated it.
         """
 
-    def tx2neo4j(self, transactions, label):
-        """Load the graphDB with transaction data"""
+    @staticmethod
+    def _operands(transactions):
+        """Yield each operand of the transactions along with the txid and the read and write sets of its transaction"""
+        for transaction_dict in transactions:
+            read, write = transaction_dict["rwset"]
+            operands = transaction_dict["transaction"]
+            # [0] -> BEGIN, unless it is implicit, [-1] -> COMMIT
+            start = 1 if operands and operands[0]["sql"] == "BEGIN" else 0
+            for operand in operands[start:-1]:
+                yield transaction_dict["txid"], read, write, operand
+
+    def tx2neo4j(self, transactions, label: dict):
+        """Load the graphDB with transaction data
+
+        The edges are buffered and written once batch_size rows are pending. Call flush() to write the rest.
+        """
 
         # If there are no transactions to process, nothing to do here.
         if len(transactions) == 0:
             return
 
-        label = self._consume_and_process_label(label)
         entrypoint = label["entry"]["methods"][0]
         action = label.get("action")
         if action is not None:
-            action = action[tuple(label["action"].keys())[0]][0]
+            action = action[next(iter(action))][0]
 
-        for transaction_dict in transactions:
-            txid = transaction_dict["txid"]
-            read, write = transaction_dict["transaction"][0]["rwset"]
-            for each_transaction in transaction_dict["transaction"][
-                1:-1
-            ]:  # [0] -> BEGIN, [-1] -> COMMIT
-                self.populate_transaction_callgraph(
-                    each_transaction["stacktrace"], txid, entrypoint
-                )
-                self.populate_transaction(
-                    label, txid, read, write, each_transaction, action
+        for txid, read, write, each_transaction in self._operands(transactions):
+            if self.has_callgraph:
+                self._callgraph_buf.append(
+                    {"tx_id": txid, "entrypoint": entrypoint, "frames": each_transaction["stacktrace"]}
                 )
+            self.populate_transaction(
+                label, txid, read, write, each_transaction, action
+            )
+            if len(self._pending_reads) + len(self._pending_writes) + len(self._callgraph_buf) >= self.batch_size:
+                self.flush()
 
     def load_transactions(self, input_file, clear, force_clear=False):
         """Load transactions data"""
 
-        yaml.add_representer(
-            OrderedDict,
-            lambda dumper, data: dumper.represent_mapping(
-                "tag:yaml.org,2002:map", list(data.items())
-            ),
-        )
-        # pylint: disable=consider-using-with,unspecified-encoding
-        data = json.load(open(input_file), object_pairs_hook=OrderedDict)
-
         # --------------------------
         # Remove all existing nodes?
         # --------------------------
         if clear:
             self._clear_all_nodes(force_clear)
 
+        self._create_indexes()
+
         Log.info(f"{type(self).__name__}: Populating transactions")
 
-        with ProgressBarFactory.get_progress_bar() as prog_bar:
-            for (_, entry) in prog_bar.track(enumerate(data), total=len(data)):
-                txn_set = self.analyze(entry["transactions"])
-                del entry["transactions"]
-                label = yaml.dump(entry, default_flow_style=True).strip()
-                self.tx2neo4j(txn_set, label)
+        # The entries are streamed from the input file
+        with open(input_file, "rb") as json_file, ProgressBarFactory.get_progress_bar() as prog_bar:
+            entries = ijson.items(json_file, "item", use_float=True)
+            for entry in prog_bar.track(entries):
+                txn_set = analyze(entry.pop("transactions"))
+                self.tx2neo4j(txn_set, entry)
+        self.flush()
@@ -20,10 +20,10 @@ Method Transaction Loader Module
 
 import re
 
-from neomodel import DoesNotExist
+from neomodel import db
 
 # Import our modules
-from dgi.models import SQLTable, MethodNode
+from dgi.models import MethodNode
 from dgi.tx2graph.abstract_transaction_loader import AbstractTransactionLoader
 
 
@@ -31,99 +31,60 @@ class MethodTransactionLoader(AbstractTransactionLoader):
     """CRUD operation at a method level.
     """
 
-    def find_or_create_program_node(self, method_signature: str, is_entrypoint=False) -> MethodNode:
-        method_name = method_signature.split(".")[-1]
-        class_short_name = method_signature.split(".")[-2]
-        class_name = ".".join(method_signature.split(".")[:-1])
+    program_node_model = MethodNode
+    program_node_key = "node_method"
+    has_callgraph = True
 
-        try:
-            node = MethodNode.nodes.get(node_method=method_signature)
-        except DoesNotExist:
-            node = MethodNode(
-                node_method=method_signature,
-                node_class=class_name,
-                node_class_name=class_short_name,
-                node_name=method_name,
-                node_short_name=class_short_name,
-                node_is_tx_entry=is_entrypoint,
-            ).save()
+    def program_node_properties(self, method_signature: str, is_entrypoint=False) -> dict:
+        return {
+            "node_method": method_signature,
+            "node_class": ".".join(method_signature.split(".")[:-1]),
+            "node_class_name": method_signature.split(".")[-2],
+            "node_name": method_signature.split(".")[-1],
+            "node_short_name": method_signature.split(".")[-2],
+            "node_is_tx_entry": is_entrypoint,
+        }
 
-        return node
-
-    def find_or_create_sql_table_node(self, table_name) -> SQLTable:
-        try:
-            node = SQLTable.nodes.get(name=table_name)
-        except DoesNotExist:
-            node = SQLTable(name=table_name).save()
-
-        return node
-
-    def populate_transaction_read(
-        self, method_signature, txid, table, action, the_sql_query
-    ) -> None:
-        method_node = self.find_or_create_program_node(method_signature)
-        table_node = self.find_or_create_sql_table_node(table)
-        rel = method_node.transaction_read.relationship(table_node)
-        if not rel:
-            method_node.transaction_read.connect(
-                table_node,
-                {
-                    "txid": txid,
-                    "tx_meth": method_signature.split(".")[-1],
-                    "action": action,
-                    "sql_query": the_sql_query,
-                },
-            )
-
-    def populate_transaction_write(
-        self, method_signature, txid, table, action, the_sql_query
-    ):
-        method_node = self.find_or_create_program_node(method_signature)
-        table_node = self.find_or_create_sql_table_node(table)
-        rel = method_node.transaction_write.relationship(table_node)
-        if not rel:
-            method_node.transaction_write.connect(
-                table_node,
-                {
-                    "txid": txid,
-                    "tx_meth": method_signature.split(".")[-1],
-                    "action": action,
-                    "sql_query": the_sql_query,
-                },
-            )
-
-    def populate_transaction_callgraph(
-            self, callstack: dict, tx_id: int, entrypoint: str) -> None:
-        """Add transaction write edges to the database
+    def populate_transaction_callgraphs(self, batch: list) -> None:
+        """Add the transaction callgraph edges of a batch of transactions to the database
 
         Args:
-            callstack (dict): The callstack from the entrypoint to the transaction.
-            tx_id (int)      : This is the ID assigned to the transaction.
-            entrypoint (str): The entrypoint that initiated this transaction.
+            batch (list): A dict for each transaction with the "frames" of the callstack from the entrypoint to the
+                          transaction, the "tx_id" assigned to the transaction and the "entrypoint" that initiated it.
         """
-        # Create a method node for this entrypoint
-        self.find_or_create_program_node(entrypoint, is_entrypoint=True)
-
-        # Iterate over all the calls in the callstack and build the callgraph.
-        for prev_call, next_call in zip(callstack[:-1], callstack[1:]):
-            # We strip the class signature (which is in the JNI type signature format) to use a dot notation
-            # E.g., Lcom/abc/class --> com.abc.class.
-            class_name_prev = re.sub("/", ".", prev_call["method"].split(", ")[1][1:])
-            # Likewise, we process the method signature as well.
-            method_name_prev = prev_call["method"].split(", ")[2].split("(")[0]
-            method_signature_prev = ".".join([class_name_prev, method_name_prev])
-            prev_node = self.find_or_create_program_node(method_signature_prev)
-
-            class_name_next = re.sub("/", ".", next_call["method"].split(", ")[1][1:])
-            method_name_next = next_call["method"].split(", ")[2].split("(")[0]
-            method_signature_next = ".".join([class_name_next, method_name_next])
-            next_node = self.find_or_create_program_node(method_signature_next)
+        rows = []
+        for callgraph in batch:
+            frames = []
+            for call in callgraph["frames"]:
+                # We strip the class signature (which is in the JNI type signature format) to use a dot notation
+                # E.g., Lcom/abc/class --> com.abc.class.
+                class_name = re.sub("/", ".", call["method"].split(", ")[1][1:])
+                # Likewise, we process the method signature as well.
+                method_name = call["method"].split(", ")[2].split("(")[0]
+                frames.append(self.program_node_properties(".".join([class_name, method_name])))
+            rows.append(
+                {
+                    "entry": self.program_node_properties(callgraph["entrypoint"], is_entrypoint=True),
+                    "frames": frames,
+                    "txid": callgraph["tx_id"],
+                    "service_entry": callgraph["entrypoint"],
+                }
+            )
 
-            rel = prev_node.transaction_method_call.relationship(next_node)
-            if not rel:
-                prev_node.transaction_method_call.connect(
-                    next_node, {"txid": tx_id, "service_entry": entrypoint}
-                )
+        # The method node of the entrypoint is created even if the callstack has no edges. It is flagged
+        # as an entrypoint whether or not it already exists, so the flag does not depend on the order in
+        # which the nodes are first written. Consecutive frames of each callstack are then linked in order.
+        db.cypher_query(
+            "UNWIND $batch AS row "
+            + self._merge_program_node("e", "row.entry")
+            + "SET e.node_is_tx_entry = true "
+            + "WITH row UNWIND range(0, size(row.frames) - 2) AS i "
+            + self._merge_program_node("p", "row.frames[i]")
+            + self._merge_program_node("n", "row.frames[i + 1]")
+            + "MERGE (p)-[r:TRANSACTIONAL_TRACE]->(n) "
+            "ON CREATE SET r.txid = row.txid, r.service_entry = row.service_entry",
+            {"batch": rows},
+        )
 
     def populate_transaction(
         self,
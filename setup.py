@@ -18,7 +18,7 @@ setup(
         "neomodel==4.0.10",
         "simple-ddl-parser==0.25.0",
         "PyYAML==6.0",
-        "ipdb==0.13.11",
+        "ijson==3.2.0",
         "pandas==1.5.3",
         "tqdm==4.65.0",
         "rich==13.3.2",
@@ -46,6 +46,7 @@ setup(
             "flake8==6.0.0",
             "black==23.1.0",
             "tox==3.24.5",
+            "ipdb==0.13.11",
         ],
     },
     entry_points={
@@ -23,6 +23,9 @@ import unittest
 from unittest.mock import patch
 from click.testing import CliRunner
 from dgi.cli import cli
+from dgi.tx2graph import ClassTransactionLoader, MethodTransactionLoader
+from dgi.tx2graph.abstract_transaction_loader import analyze, crud, crud0
+from dgi.tx2graph.utils import sqlexp
 from py2neo import Graph
 import logging
 
@@ -168,3 +171,267 @@ class TestTX2GCLI(unittest.TestCase):
             result.output
         )
         self.assertEqual(result.exit_code, 2)
+
+
+######################################################################
+#  T R A N S A C T I O N   L O A D E R   T E S T   C A S E S
+######################################################################
+
+
+def make_operand(sql, *methods):
+    """Build a DiVA operand whose stacktrace goes through the given Class.method names"""
+    stacktrace = [
+        {"method": f"<src-method: < Source, Lcom/example/{method.split('.')[0]}, {method.split('.')[1]}()V >>"}
+        for method in methods
+    ]
+    return {"sql": sql, "stacktrace": stacktrace}
+
+
+@patch("dgi.tx2graph.method_transaction_loader.db")
+@patch("dgi.tx2graph.abstract_transaction_loader.db")
+class TestTransactionLoader(unittest.TestCase):
+    """Test Cases for the batched writes of the transaction loaders"""
+
+    def setUp(self):
+        self.transactions = [
+            {
+                "txid": 7,
+                "transaction": [
+                    {"sql": "BEGIN"},
+                    make_operand("SELECT a FROM accountejb WHERE (id = ?)", "Servlet.doGet", "Dao.find"),
+                    make_operand("UPDATE holdingejb SET q = ? WHERE (id = ?)", "Servlet.doGet", "Dao.save"),
+                    {"sql": "COMMIT"},
+                ],
+            }
+        ]
+        self.label = {"entry": {"methods": ["com.example.Servlet.doGet"]}}
+
+    def test_flush_batches_rows(self, abstract_db, method_db):
+        """Test that buffered edges are written with one UNWIND query per kind"""
+        loader = MethodTransactionLoader()
+        loader.tx2neo4j(analyze(self.transactions), self.label)
+        abstract_db.cypher_query.assert_not_called()
+        method_db.cypher_query.assert_not_called()
+
+        loader.flush()
+
+        # One query for the callgraphs of both operands
+        method_db.cypher_query.assert_called_once()
+        query, params = method_db.cypher_query.call_args[0]
+        self.assertTrue(query.startswith("UNWIND $batch AS row "))
+        self.assertIn("SET e.node_is_tx_entry = true", query)
+        self.assertIn("MERGE (p)-[r:TRANSACTIONAL_TRACE]->(n)", query)
+        self.assertEqual(len(params["batch"]), 2)
+        row = params["batch"][1]
+        self.assertEqual(row["txid"], 7)
+        self.assertEqual(row["service_entry"], "com.example.Servlet.doGet")
+        self.assertTrue(row["entry"]["node_is_tx_entry"])
+        self.assertEqual(
+            [frame["node_method"] for frame in row["frames"]],
+            ["com.example.Servlet.doGet", "com.example.Dao.save"],
+        )
+
+        # One query for the reads, then one for the writes
+        self.assertEqual(abstract_db.cypher_query.call_count, 2)
+        (read_query, read_params), (write_query, write_params) = [
+            call[0] for call in abstract_db.cypher_query.call_args_list
+        ]
+        self.assertIn("MERGE (t)-[r:TRANSACTION_READ]->(p)", read_query)
+        self.assertEqual(
+            read_params["rows"],
+            [
+                {
+                    "table": "accountejb",
+                    "program": {
+                        "node_method": "com.example.Dao.find",
+                        "node_class": "com.example.Dao",
+                        "node_class_name": "Dao",
+                        "node_name": "find",
+                        "node_short_name": "Dao",
+                        "node_is_tx_entry": False,
+                    },
+                    "props": {
+                        "txid": 7,
+                        "tx_meth": "find",
+                        "action": None,
+                        "sql_query": "select a from accountejb where (id = ?)",
+                    },
+                }
+            ],
+        )
+        self.assertIn("MERGE (p)-[r:TRANSACTION_WRITE]->(t)", write_query)
+        self.assertEqual([row["table"] for row in write_params["rows"]], ["holdingejb"])
+        self.assertEqual(write_params["rows"][0]["program"]["node_method"], "com.example.Dao.save")
+
+        # The buffers are emptied by the flush
+        loader.flush()
+        self.assertEqual(method_db.cypher_query.call_count, 1)
+        self.assertEqual(abstract_db.cypher_query.call_count, 2)
+
+    def test_flush_when_batch_is_full(self, abstract_db, method_db):
+        """Test that the buffers are written as soon as they reach the batch size"""
+        loader = MethodTransactionLoader()
+        loader.batch_size = 2
+        loader.tx2neo4j(analyze(self.transactions), self.label)
+        # Each operand buffers a callgraph and a read or a write, which fills the batch
+        self.assertEqual(method_db.cypher_query.call_count, 2)
+        self.assertEqual(abstract_db.cypher_query.call_count, 2)
+        for call in method_db.cypher_query.call_args_list + abstract_db.cypher_query.call_args_list:
+            self.assertEqual(len(next(iter(call[0][1].values()))), 1)
+
+    def test_load_transactions(self, abstract_db, method_db):
+        """Test that the streamed entries are loaded and the last partial batch is flushed"""
+        loader = MethodTransactionLoader()
+        loader.batch_size = 64
+        loader.load_transactions("tests/fixtures/trading_app_transactions.json", clear=False)
+
+        reads, writes = [], []
+        for call in abstract_db.cypher_query.call_args_list:
+            if "TRANSACTION_READ" in call[0][0]:
+                reads.append(len(call[0][1]["rows"]))
+            elif "TRANSACTION_WRITE" in call[0][0]:
+                writes.append(len(call[0][1]["rows"]))
+        callgraphs = [len(call[0][1]["batch"]) for call in method_db.cypher_query.call_args_list]
+        # One full batch is written while streaming, the remaining rows by the final flush
+        self.assertEqual(len(callgraphs), 2)
+        self.assertEqual(len(reads), 2)
+        self.assertEqual(len(writes), 2)
+        self.assertLess(reads[1] + writes[1] + callgraphs[1], loader.batch_size)
+        self.assertEqual((sum(reads), sum(writes), sum(callgraphs)), (41, 32, 38))
+
+    def test_class_loader_skips_callgraph(self, abstract_db, method_db):
+        """Test that the class loader neither buffers nor counts callgraph rows"""
+        loader = ClassTransactionLoader()
+        loader.batch_size = 2
+        with patch.object(ClassTransactionLoader, "populate_transaction_callgraphs") as callgraphs:
+            loader.tx2neo4j(analyze(self.transactions), self.label)
+            # The read and the write fill one batch together
+            self.assertEqual(abstract_db.cypher_query.call_count, 2)
+            loader.flush()
+        callgraphs.assert_not_called()
+        method_db.cypher_query.assert_not_called()
+        self.assertEqual(abstract_db.cypher_query.call_count, 2)
+        reads = abstract_db.cypher_query.call_args_list[0][0][1]["rows"]
+        writes = abstract_db.cypher_query.call_args_list[1][0][1]["rows"]
+        self.assertEqual([row["table"] for row in reads], ["accountejb"])
+        self.assertEqual([row["table"] for row in writes], ["holdingejb"])
+
+
+######################################################################
+#  C R U D   T E S T   C A S E S
+######################################################################
+
+SQL_STATEMENTS = [
+    "SELECT ACCOUNTID, BALANCE FROM accountejb WHERE (PROFILE_USERID = ?)",
+    "UPDATE accountejb SET LOGOUTCOUNT = ? WHERE (ACCOUNTID = ?)",
+    "INSERT INTO holdingejb (HOLDINGID, QUANTITY) VALUES (?, ?)",
+    "DELETE FROM orderejb WHERE (ORDERID = ?)",
+    "SELECT t1.HOLDINGID FROM accountejb t0, holdingejb t1 WHERE ((t0.PROFILE_USERID = ?) AND (t0.ACCOUNTID = t1.A))",
+    "select a as x from b t, (select c from d) u",
+    "select a as x from b t left outer join ( select * from d ) u on t.i = u.i, e w",
+    "with t0 as ( select * from u ), t1 as ( select * from w ) select * from t0, t1",
+    "select * from t union select * from u",
+    "select * from ((select * from t) union (select * from d) order by x)",
+    "select t0.x, t1.y from a t0, (select * from b t1, (select * from c) t2) as t3",
+    "select t.a, s.a from s, (select * from x union select * from y) as t",
+    "insert into h (a, b) values ((select max(x) from y), ?)",
+    "update q set a = (select max(b) from z) where c in (select d from w)",
+    "delete from o where i in (select j from k)",
+]
+
+
+class TestCrud(unittest.TestCase):
+    """Test Cases for the tables read and written by SQL statements"""
+
+    def test_crud0(self):
+        """Test the tables found by crud0"""
+        expected = {
+            "SELECT ACCOUNTID, BALANCE FROM accountejb WHERE (PROFILE_USERID = ?)": ({"accountejb"}, set()),
+            "UPDATE accountejb SET LOGOUTCOUNT = ? WHERE (ACCOUNTID = ?)": (set(), {"accountejb"}),
+            "select a as x from b t, (select c from d) u": ({"b", "d"}, set()),
+            "select t0.x, t1.y from a t0, (select * from b t1, (select * from c) t2) as t3": ({"a", "b", "c"}, set()),
+            "delete from o where i in (select j from k)": ({"k"}, {"o"}),
+        }
+        for sql, (reads, writes) in expected.items():
+            self.assertEqual(crud0(sqlexp(sql.lower())[1]), [reads, writes], sql)
+
+    def test_crud(self):
+        """Test that crud caches the tables found by crud0 for each statement"""
+        crud.cache_clear()
+        for sql in SQL_STATEMENTS:
+            read_set, write_set = crud0(sqlexp(sql.lower())[1])
+            self.assertEqual(crud(sql), (frozenset(read_set), frozenset(write_set)), sql)
+        self.assertIs(crud(SQL_STATEMENTS[0]), crud(SQL_STATEMENTS[0]))
+        self.assertEqual(crud.cache_info().misses, len(SQL_STATEMENTS))
+
+
+######################################################################
+#  A N A L Y Z E   T E S T   C A S E S
+######################################################################
+
+READ_ACCOUNT = "SELECT a FROM accountejb WHERE (id = ?)"
+WRITE_HOLDING = "UPDATE holdingejb SET q = ? WHERE (id = ?)"
+WRITE_ORDER = "DELETE FROM orderejb WHERE (id = ?)"
+
+
+def rwsets(*transactions):
+    """The rwsets found by analyze for transactions given as lists of SQL statements"""
+    txn_set = [
+        {"txid": txid, "transaction": [{"sql": sql} for sql in sqls]} for txid, sqls in enumerate(transactions)
+    ]
+    return [txn["rwset"] for txn in analyze(txn_set)]
+
+
+class TestAnalyze(unittest.TestCase):
+    """Test Cases for the read and write sets of transactions"""
+
+    def test_explicit_begin(self):
+        """Test a transaction that starts with BEGIN"""
+        self.assertEqual(rwsets(["BEGIN", READ_ACCOUNT, WRITE_HOLDING, "COMMIT"]), [({"accountejb"}, {"holdingejb"})])
+
+    def test_implicit_begin(self):
+        """Test a transaction whose BEGIN is implicit"""
+        self.assertEqual(rwsets([READ_ACCOUNT, WRITE_HOLDING, "COMMIT"]), [({"accountejb"}, {"holdingejb"})])
+
+    def test_nested_transactions(self):
+        """Test that nested transactions are merged into the enclosing one"""
+        self.assertEqual(
+            rwsets(
+                ["BEGIN", READ_ACCOUNT, "BEGIN", WRITE_HOLDING, "COMMIT", "BEGIN", WRITE_ORDER, "ROLLBACK", "COMMIT"],
+                [READ_ACCOUNT, "BEGIN", WRITE_HOLDING, "COMMIT", "COMMIT"],
+            ),
+            [
+                ({"accountejb"}, {"holdingejb", "orderejb"}),
+                ({"accountejb"}, {"holdingejb"}),
+            ],
+        )
+
+    def test_sequential_transactions(self):
+        """Test that only the first of sequential transactions is analyzed"""
+        self.assertEqual(
+            rwsets(["BEGIN", READ_ACCOUNT, "COMMIT", "BEGIN", WRITE_HOLDING, "COMMIT"]), [({"accountejb"}, set())]
+        )
+
+    def test_empty_transaction(self):
+        """Test a transaction without statements"""
+        self.assertEqual(rwsets([]), [(set(), set())])
+
+    @patch("dgi.tx2graph.method_transaction_loader.db")
+    @patch("dgi.tx2graph.abstract_transaction_loader.db")
+    def test_analyze(self, abstract_db, method_db):
+        """Test that analyze attaches the rwsets without changing the operands"""
+        transactions = [
+            {"txid": 1, "transaction": [make_operand(READ_ACCOUNT, "Servlet.doGet"), {"sql": "COMMIT"}]},
+            {"txid": 2, "transaction": []},
+        ]
+        analyze(transactions)
+        self.assertEqual(transactions[0]["rwset"], ({"accountejb"}, set()))
+        self.assertEqual(transactions[1]["rwset"], (set(), set()))
+        self.assertEqual([op["sql"] for op in transactions[0]["transaction"]], [READ_ACCOUNT, "COMMIT"])
+
+        # The operand after the implicit BEGIN is loaded, and the empty transaction is skipped
+        loader = MethodTransactionLoader()
+        loader.tx2neo4j(transactions, {"entry": {"methods": ["com.example.Servlet.doGet"]}})
+        loader.flush()
+        self.assertEqual(len(method_db.cypher_query.call_args[0][1]["batch"]), 1)
+        self.assertEqual(abstract_db.cypher_query.call_count, 1)